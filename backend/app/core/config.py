@@ -7,6 +7,40 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
 
+    # Tenant deletion runs in the background in small batches so it never
+    # holds long locks that other tenants would queue behind.
+    TENANT_DELETE_BATCH_SIZE: int = 500
+    TENANT_DELETE_THROTTLE_SECONDS: float = 0.05
+    # A running job whose heartbeat is older than this is taken over by another worker
+    TENANT_DELETE_STALE_SECONDS: int = 120
+
+    # Tenant shards as {"name": "database url"}, e.g. via the env var
+    # SHARD_DATABASE_URLS='{"a": "sqlite:///./shard_a.db", "b": "sqlite:///./shard_b.db"}'.
+    # Empty means a single "default" shard living in the main database.
+    SHARD_DATABASE_URLS: dict[str, str] = {}
+    TENANT_DIRECTORY_CACHE_SECONDS: float = 5
+    TENANT_MOVE_BATCH_SIZE: int = 500
+    TENANT_MOVE_GRACE_SECONDS: float = 2
+    # A directory email this old whose user is missing from its shard was left
+    # by a crash between the directory and shard commits, and is released
+    DIRECTORY_ORPHAN_GRACE_SECONDS: int = 60
+
+    # How often each worker polls the shared profiling session: quickly while a
+    # session runs (flushing its samples), slowly while idle
+    PROFILE_SYNC_SECONDS: float = 1
+    PROFILE_IDLE_SYNC_SECONDS: float = 15
+
+    # Production server (python -m app.serve)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0 # 0 = one per available CPU, honoring cgroup limits
+    SERVER_MAX_REQUESTS: int = 10000 # recycle workers to contain slow leaks
+    SERVER_MAX_REQUESTS_JITTER: int = 1000
+    SERVER_TIMEOUT: int = 60
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    SERVER_KEEPALIVE: int = 5
+    SERVER_HEARTBEAT_SECONDS: int = 10 # how often each worker reports in for /health
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
 settings = Settings()
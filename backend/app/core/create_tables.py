@@ -1,6 +1,6 @@
-from app.core.database import engine, Base
-from app.models import company, user
+from app.core.sharding import create_all_tables
+from app.models import company, user, activity, tenant_deletion, directory
 
 print("Creating database tables...")
-Base.metadata.create_all(bind=engine)
+create_all_tables()
 print("Tables created successfully ✅")
@@ -1,21 +1,39 @@
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-import os
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from dotenv import load_dotenv
 
+from app.core.config import settings
+
 load_dotenv()
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-db_path = os.path.join(BASE_DIR, "saas_platform.db")
-DATABASE_URL = f"sqlite:///{db_path}"
+def create_database_engine(url: str):
+    # SQLite connections are shared with the threadpool running sync endpoints
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False})
+    if url.startswith("postgresql://"):
+        # The driver in requirements.txt; SQLAlchemy 2.1 defaults to psycopg 3
+        url = "postgresql+psycopg2://" + url[len("postgresql://"):]
+    return create_engine(url, pool_pre_ping=True)
+
+DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_database_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 Base = declarative_base()
+# Global tables (tenant directory, jobs) that live in the main database, not in the shards
+DirectoryBase = declarative_base()
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def dialect_insert(db: Session, model):
+    # INSERT ... ON CONFLICT lives on the dialect-specific insert() constructs
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
@@ -0,0 +1,488 @@
+"""On-demand statistical profiler for live requests.
+
+A background thread samples the Python stacks of requests picked by the
+active session. Samples are attributed to their request by walking each
+thread's stack up to either ProfilingMiddleware.__call__ (async code on the
+event loop) or anyio's worker thread loop, whose copied context carries the
+request tag (sync endpoints and dependencies in the threadpool).
+
+Sessions are shared through the main database so they cover every worker:
+the admin endpoints write a ``profile_sessions`` row, each worker polls it
+(every PROFILE_IDLE_SYNC_SECONDS while idle, PROFILE_SYNC_SECONDS while a
+session runs) and flushes what it sampled to ``profile_worker_samples``, and
+the exports merge those rows.
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal, dialect_insert
+from app.models.profiling import ProfileSessionRecord, ProfileWorkerSamples
+
+logger = logging.getLogger("saas_platform")
+
+_request_tag: contextvars.ContextVar = contextvars.ContextVar("profile_request_tag", default=None)
+
+# Leaf-most match wins, so bcrypt under an ORM call still counts as bcrypt
+CATEGORIES = (
+    ("bcrypt", ("passlib", "bcrypt")),
+    ("orm", ("sqlalchemy",)),
+    ("serialization", ("pydantic", "pydantic_core", "json", "fastapi.encoders")),
+)
+
+# Requests to the profiling endpoints themselves are never sampled
+EXCLUDED_PREFIX = "/admin/profiling"
+
+# Overhead is only judged once a session has enough samples to be meaningful
+OVERHEAD_WARMUP_SAMPLES = 50
+
+class ProfileSession:
+    """One worker's view of a shared session, or every worker's merged by load_session()."""
+
+    def __init__(self, record: ProfileSessionRecord):
+        self.id = record.id
+        self.route = record.route
+        self.company_id = record.company_id
+        self.sample_rate = record.sample_rate
+        self.interval = record.interval_ms / 1000
+        self.max_overhead = record.max_overhead
+
+        self.started_at = record.started_at
+        self.expires_at = record.expires_at
+        self.stopped_at: float | None = record.stopped_at
+        self.stop_reason: str | None = record.stop_reason
+
+        self.workers = 0
+        self.requests_profiled = 0
+        self.samples = 0
+        self.sampling_seconds = 0.0
+        self.active_seconds = 0.0
+        # (route, company_id, frames root-first) -> sample count
+        self.stacks: Counter = Counter()
+        self.categories: Counter = Counter()
+        # Counters as of the last flush to the database
+        self.flushed = (0, 0)
+
+    @property
+    def active(self) -> bool:
+        return self.stopped_at is None
+
+    @property
+    def overhead(self) -> float:
+        if not self.active_seconds:
+            return 0.0
+        return self.sampling_seconds / self.active_seconds
+
+    def matches(self, path: str, company_id: int | None) -> bool:
+        if path.startswith(EXCLUDED_PREFIX):
+            return False
+        if self.route is not None and not path.startswith(self.route):
+            return False
+        if self.company_id is not None and company_id != self.company_id:
+            return False
+        return random.random() < self.sample_rate
+
+    def to_dict(self) -> dict:
+        return {
+            "active": self.active,
+            "route": self.route,
+            "company_id": self.company_id,
+            "sample_rate": self.sample_rate,
+            "interval_ms": self.interval * 1000,
+            "max_overhead": self.max_overhead,
+            "started_at": self.started_at,
+            "expires_at": self.expires_at,
+            "stopped_at": self.stopped_at,
+            "stop_reason": self.stop_reason,
+            "workers": self.workers,
+            "requests_profiled": self.requests_profiled,
+            "samples": self.samples,
+            "overhead": round(self.overhead, 4),
+            "categories": dict(self.categories),
+        }
+
+class Profiler:
+    """Samples requests in this worker process for the session found in the database."""
+
+    def __init__(self):
+        self.session: ProfileSession | None = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._in_flight = 0
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._sync_thread: threading.Thread | None = None
+
+    @property
+    def active(self) -> bool:
+        return self.session is not None and self.session.active
+
+    def start(self, session: ProfileSession) -> ProfileSession:
+        with self._lock:
+            if self.active:
+                self._stop_locked("replaced")
+            self.session = session
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        logger.info(f"Profiling session {session.id} started: route={session.route} company_id={session.company_id}")
+        return session
+
+    def stop(self, reason: str = "stopped") -> ProfileSession | None:
+        with self._lock:
+            self._stop_locked(reason)
+        return self.session
+
+    def _stop_locked(self, reason: str):
+        if self.session is not None and self.session.active:
+            self.session.stopped_at = time.time()
+            self.session.stop_reason = reason
+            logger.info(f"Profiling session {self.session.id} stopped: {reason}")
+        self._wakeup.set()
+
+    def request_started(self, session: ProfileSession):
+        with self._lock:
+            session.requests_profiled += 1
+            self._in_flight += 1
+        self._wakeup.set()
+
+    def request_finished(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def start_sync(self):
+        # Called from a startup hook, so each worker polls from its own process
+        if self._sync_thread is None or not self._sync_thread.is_alive():
+            self._sync_thread = threading.Thread(target=self._sync_loop, name="profiler-sync", daemon=True)
+            self._sync_thread.start()
+
+    def _sync_loop(self):
+        while True:
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("Profiler sync failed")
+            time.sleep(settings.PROFILE_SYNC_SECONDS if self._busy else settings.PROFILE_IDLE_SYNC_SECONDS)
+
+    @property
+    def _busy(self) -> bool:
+        # A stopped session still needs its last samples flushed
+        session = self.session
+        return session is not None and (session.active or (session.samples, session.requests_profiled) != session.flushed)
+
+    def sync(self):
+        """Follow the shared session and flush this worker's samples to it."""
+        with self._sync_lock:
+            db = SessionLocal()
+            try:
+                record = _latest_record(db)
+                local = self.session
+                if local is not None and record is not None and record.id == local.id:
+                    if local.active and not _record_active(record):
+                        self.stop(record.stop_reason or "timeout")
+                    elif not local.active and record.stopped_at is None and local.stop_reason != "timeout":
+                        # This worker went over the overhead budget; stop the session everywhere
+                        record.stopped_at = local.stopped_at
+                        record.stop_reason = local.stop_reason
+                        db.commit()
+                    self._flush(db, local)
+                elif local is not None and local.active:
+                    # A newer session took over; this one's samples are no longer reported
+                    self.stop("replaced")
+
+                if record is not None and _record_active(record) and (local is None or local.id != record.id):
+                    self.start(ProfileSession(record))
+            finally:
+                db.close()
+
+    def _flush(self, db: Session, session: ProfileSession):
+        with self._lock:
+            counts = (session.samples, session.requests_profiled)
+            if counts == session.flushed:
+                return
+            values = {
+                "requests_profiled": session.requests_profiled,
+                "samples": session.samples,
+                "sampling_seconds": session.sampling_seconds,
+                "active_seconds": session.active_seconds,
+                "stacks": json.dumps([
+                    [route, company_id, list(frames), count]
+                    for (route, company_id, frames), count in session.stacks.items()
+                ]),
+                "categories": json.dumps(dict(session.categories)),
+            }
+
+        stmt = dialect_insert(db, ProfileWorkerSamples).values(
+            session_id=session.id,
+            worker=f"{socket.gethostname()}:{os.getpid()}",
+            **values
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[ProfileWorkerSamples.session_id, ProfileWorkerSamples.worker],
+            set_=values
+        ))
+        db.commit()
+        session.flushed = counts
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while True:
+            session = self.session
+            if session is None or not session.active:
+                return
+
+            if time.time() >= session.expires_at:
+                self.stop("timeout")
+                return
+
+            # Idle until a profiled request is in flight
+            if not self._in_flight:
+                self._wakeup.clear()
+                self._wakeup.wait(timeout=1.0)
+                continue
+
+            started = time.perf_counter()
+            stacks = self._sample(own_ident)
+            spent = time.perf_counter() - started
+
+            with self._lock:
+                for key, category in stacks:
+                    session.stacks[key] += 1
+                    session.categories[category] += 1
+                session.samples += 1
+                session.sampling_seconds += spent
+                session.active_seconds += max(session.interval, spent)
+            if session.samples >= OVERHEAD_WARMUP_SAMPLES and session.overhead > session.max_overhead:
+                self.stop("overhead budget exceeded")
+                return
+
+            time.sleep(session.interval)
+
+    def _sample(self, own_ident: int) -> list:
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            tag, frames = _walk_request_stack(frame)
+            if tag is None or not frames:
+                continue
+
+            scope, company_id = tag
+            route = _route_label(scope)
+            stacks.append(((route, company_id, tuple(reversed(frames))), _categorize(frames)))
+        return stacks
+
+profiler = Profiler()
+
+def _latest_record(db: Session) -> ProfileSessionRecord | None:
+    return db.query(ProfileSessionRecord).order_by(ProfileSessionRecord.id.desc()).first()
+
+def _record_active(record: ProfileSessionRecord) -> bool:
+    return record.stopped_at is None and time.time() < record.expires_at
+
+def start_session(
+    db: Session,
+    route: str | None,
+    company_id: int | None,
+    sample_rate: float,
+    interval_ms: float,
+    duration_seconds: int,
+    max_overhead: float
+) -> ProfileSessionRecord:
+    """Store a new shared session; workers pick it up on their next sync."""
+    now = time.time()
+    record = ProfileSessionRecord(
+        route=route,
+        company_id=company_id,
+        sample_rate=sample_rate,
+        interval_ms=interval_ms,
+        max_overhead=max_overhead,
+        started_at=now,
+        expires_at=now + duration_seconds
+    )
+    db.add(record)
+    db.flush()
+    # Only the latest session is ever reported, so earlier ones are dropped.
+    # Keeping the new row means ids are never reused for a different session.
+    db.query(ProfileWorkerSamples).filter(ProfileWorkerSamples.session_id < record.id).delete(synchronize_session=False)
+    db.query(ProfileSessionRecord).filter(ProfileSessionRecord.id < record.id).delete(synchronize_session=False)
+    db.commit()
+    db.refresh(record)
+    return record
+
+def stop_session(db: Session, reason: str = "stopped") -> ProfileSessionRecord | None:
+    record = _latest_record(db)
+    if record is not None and _record_active(record):
+        record.stopped_at = time.time()
+        record.stop_reason = reason
+        db.commit()
+    return record
+
+def load_session(db: Session) -> ProfileSession | None:
+    """The latest session with the samples of every worker merged."""
+    record = _latest_record(db)
+    if record is None:
+        return None
+
+    session = ProfileSession(record)
+    if session.active and time.time() >= session.expires_at:
+        session.stopped_at = session.expires_at
+        session.stop_reason = "timeout"
+
+    for row in db.query(ProfileWorkerSamples).filter(ProfileWorkerSamples.session_id == record.id).all():
+        session.workers += 1
+        session.requests_profiled += row.requests_profiled
+        session.samples += row.samples
+        session.sampling_seconds += row.sampling_seconds
+        session.active_seconds += row.active_seconds
+        for route, company_id, frames, count in json.loads(row.stacks):
+            session.stacks[(route, company_id, tuple(frames))] += count
+        session.categories.update(json.loads(row.categories))
+    return session
+
+def _route_label(scope) -> str:
+    # The router stores the matched route on the shared scope, which groups
+    # /users/1 and /users/2 under /users/{user_id}
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope["path"]
+    return f"{scope['method']} {path}"
+
+def _frame_label(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+def _walk_request_stack(frame):
+    # Returns the request tag and the frames (leaf-first) below the request entry point
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        if code is _MIDDLEWARE_CODE:
+            return frame.f_locals.get("tag"), frames
+        if code is _ANYIO_WORKER_CODE:
+            context = frame.f_locals.get("context")
+            if isinstance(context, contextvars.Context):
+                return context.get(_request_tag), frames
+            return None, frames
+        frames.append(_frame_label(frame))
+        frame = frame.f_back
+    return None, frames
+
+def _categorize(frames) -> str:
+    for label in frames:
+        module = label.split(":", 1)[0]
+        for category, prefixes in CATEGORIES:
+            if any(module == prefix or module.startswith(prefix + ".") for prefix in prefixes):
+                return category
+    return "app"
+
+def _company_id_from_headers(headers) -> int | None:
+    for name, value in headers:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return None
+            try:
+                payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+            except JWTError:
+                return None
+            return payload.get("company_id")
+    return None
+
+class ProfilingMiddleware:
+    """ASGI middleware that marks requests selected by the active profile session."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        session = profiler.session
+        # Fast path: a single attribute check when no session is running
+        if scope["type"] != "http" or session is None or not session.active:
+            await self.app(scope, receive, send)
+            return
+
+        if time.time() >= session.expires_at:
+            profiler.stop("timeout")
+            await self.app(scope, receive, send)
+            return
+
+        company_id = _company_id_from_headers(scope["headers"])
+        if not session.matches(scope["path"], company_id):
+            await self.app(scope, receive, send)
+            return
+
+        # Read by the sampler from this frame (event loop) or from the
+        # copied context (threadpool)
+        tag = (scope, company_id)
+        token = _request_tag.set(tag)
+        profiler.request_started(session)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.request_finished()
+            _request_tag.reset(token)
+
+_MIDDLEWARE_CODE = ProfilingMiddleware.__call__.__code__
+
+def _anyio_worker_code():
+    try:
+        from anyio._backends._asyncio import WorkerThread
+    except ImportError:
+        return None
+    return WorkerThread.run.__code__
+
+_ANYIO_WORKER_CODE = _anyio_worker_code()
+
+def collapsed_stacks(session: ProfileSession) -> str:
+    """Brendan Gregg's collapsed format, one ``frame;frame;... count`` per line."""
+    lines = []
+    for (route, company_id, frames), count in session.stacks.most_common():
+        root = [f"route:{route}", f"company:{company_id}"]
+        lines.append(f"{';'.join(root + list(frames))} {count}")
+    return "\n".join(lines) + "\n"
+
+def speedscope_profile(session: ProfileSession) -> dict:
+    """Speedscope file with one sampled profile per route and company."""
+    frame_index: dict = {}
+    frames = []
+    profiles: dict = {}
+    weight = session.interval * 1000
+
+    for (route, company_id, stack), count in session.stacks.items():
+        indices = []
+        for label in stack:
+            if label not in frame_index:
+                frame_index[label] = len(frames)
+                frames.append({"name": label})
+            indices.append(frame_index[label])
+
+        profile = profiles.setdefault((route, company_id), {
+            "type": "sampled",
+            "name": f"{route} (company {company_id})",
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": 0,
+            "samples": [],
+            "weights": [],
+        })
+        profile["samples"].append(indices)
+        profile["weights"].append(count * weight)
+        profile["endValue"] += count * weight
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": "saas_platform request profile",
+        "exporter": "saas_platform",
+        "shared": {"frames": frames},
+        "profiles": list(profiles.values()),
+    }
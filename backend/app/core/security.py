@@ -8,7 +8,9 @@ from typing import List, Callable
 # Note: assuming get_db is moved to app.api.dependencies eventually, but for now it's in app.core.database
 from app.core.database import SessionLocal
 from app.models.user import User
+from app.models.company import Company
 from app.core.config import settings
+from app.core.sharding import tenant_session
 
 security = HTTPBearer()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -26,31 +28,65 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    token = credentials.credentials
-
+def get_token_payload(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> dict:
+    # Validates the token without touching the users table, for callers whose
+    # user row may already be gone (e.g. polling a tenant deletion job)
     try:
         payload = jwt.decode(
-            token,
+            credentials.credentials,
             settings.JWT_SECRET,
             algorithms=[settings.JWT_ALGORITHM]
         )
-        user_id = payload.get("user_id")
-        if user_id is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
 
-    user = db.query(User).filter(User.id == user_id).first()
+    if payload.get("user_id") is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
+    return payload
+
+def get_tenant_db(payload: dict = Depends(get_token_payload)):
+    # Session on the shard holding the token's company, resolved via the tenant directory
+    db = tenant_session(payload.get("company_id"))
+    if db is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Company not found")
+    try:
+        yield db
+    finally:
+        db.close()
+
+def load_user(db: Session, user_id: int) -> User | None:
+    """Load a user, refusing tenants that are being deleted.
+
+    Their logins, refreshes and activity logs would race the deletion job.
+    """
+    row = db.query(User, Company.status).outerjoin(
+        Company, Company.id == User.company_id
+    ).filter(User.id == user_id).first()
+    if row is None:
+        return None
+
+    user, company_status = row
+    if company_status == "deleting":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Company is being deleted"
+        )
+    return user
+
+def get_current_user(
+    payload: dict = Depends(get_token_payload),
+    db: Session = Depends(get_tenant_db)
+) -> User:
+    user = load_user(db, payload["user_id"])
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
 
     return user
 
 def require_roles(roles: List[str]) -> Callable:
+    # Tenants being deleted are already turned away by get_current_user
     def role_checker(current_user: User = Depends(get_current_user)):
         if current_user.role not in roles:
             raise HTTPException(
@@ -58,4 +94,8 @@ def require_roles(roles: List[str]) -> Callable:
                 detail="Operation not permitted"
             )
         return current_user
-    return role_checker
\ No newline at end of file
+    return role_checker
+
+# For endpoints that span tenants (profiling, cross-shard reports); the role
+# is only ever assigned directly in the database, never by company admins
+require_platform_admin = require_roles(["PLATFORM_ADMIN"])
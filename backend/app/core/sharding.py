@@ -0,0 +1,200 @@
+"""Routes tenant data to per-shard databases by company_id.
+
+The main database (app.core.database) holds the global directory: which
+shard each company lives on, plus email-to-tenant lookup for login. Users,
+companies and activity logs live in the shards. The main database is
+always the "default" shard: with SHARD_DATABASE_URLS unset it is the only
+one, otherwise it keeps serving the tenants created before sharding was
+turned on until they are moved off.
+"""
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.database import engine, SessionLocal, Base, DirectoryBase, create_database_engine, dialect_insert
+from app.core.exceptions import BaseAPIException
+from app.models.company import Company
+from app.models.directory import TenantDirectory, UserDirectory
+from app.models.user import User
+
+logger = logging.getLogger("saas_platform")
+
+DEFAULT_SHARD = "default"
+
+class TenantSession(Session):
+    """Session bound to one tenant's shard. Commits are refused while the tenant is moving or being deleted."""
+
+shard_engines = {DEFAULT_SHARD: engine}
+shard_engines.update({name: create_database_engine(url) for name, url in settings.SHARD_DATABASE_URLS.items()})
+
+# New tenants only go to the configured shards, not to the main database
+placement_shards = list(settings.SHARD_DATABASE_URLS) or [DEFAULT_SHARD]
+
+shard_sessions = {
+    name: sessionmaker(bind=shard_engine, autoflush=False, autocommit=False)
+    for name, shard_engine in shard_engines.items()
+}
+tenant_sessions = {
+    name: sessionmaker(bind=shard_engine, class_=TenantSession, autoflush=False, autocommit=False)
+    for name, shard_engine in shard_engines.items()
+}
+
+# company_id -> (shard, status, expires_at); short-lived so moves propagate across workers
+_directory_cache: dict = {}
+
+def create_all_tables():
+    DirectoryBase.metadata.create_all(bind=engine)
+    for shard_engine in shard_engines.values():
+        Base.metadata.create_all(bind=shard_engine)
+
+def dispose_engines():
+    # Called after fork so workers don't share pooled connections
+    engine.dispose(close=False)
+    for shard_engine in shard_engines.values():
+        if shard_engine is not engine:
+            shard_engine.dispose(close=False)
+
+def _lookup_company(company_id: int):
+    # Reads the directory and refreshes the cache
+    db = SessionLocal()
+    try:
+        entry = db.query(TenantDirectory.shard, TenantDirectory.status).filter(
+            TenantDirectory.company_id == company_id
+        ).first()
+    finally:
+        db.close()
+
+    if entry is None:
+        forget_company(company_id)
+    else:
+        _directory_cache[company_id] = (entry.shard, entry.status, time.monotonic() + settings.TENANT_DIRECTORY_CACHE_SECONDS)
+    return entry
+
+def shard_for_company(company_id: int) -> str | None:
+    cached = _directory_cache.get(company_id)
+    if cached and cached[2] > time.monotonic():
+        return cached[0]
+
+    entry = _lookup_company(company_id)
+    return entry.shard if entry else None
+
+def forget_company(company_id: int):
+    _directory_cache.pop(company_id, None)
+
+def tenant_session(company_id: int) -> TenantSession | None:
+    shard = shard_for_company(company_id)
+    if shard is None or shard not in tenant_sessions:
+        return None
+    return tenant_sessions[shard](info={"company_id": company_id, "shard": shard})
+
+@event.listens_for(TenantSession, "before_commit")
+def _refuse_writes_unless_active(session: TenantSession):
+    company_id = session.info["company_id"]
+    # move_tenant and run_tenant_deletion wait for cached routes to expire
+    # before touching rows, so a fresh "active" entry for this shard can be
+    # trusted without a query
+    cached = _directory_cache.get(company_id)
+    if cached and cached[2] > time.monotonic() and cached[1] == "active" and cached[0] == session.info["shard"]:
+        return
+
+    entry = _lookup_company(company_id)
+    if entry is None:
+        # Deleted while this session was open
+        raise BaseAPIException("Company not found", status_code=404)
+    if entry.status == "deleting":
+        raise BaseAPIException("Company is being deleted", status_code=403)
+    if entry.status == "moving" or entry.shard != session.info["shard"]:
+        raise BaseAPIException("Tenant is being moved, please retry shortly", status_code=503)
+
+def release_orphaned_email(db: Session, email: str):
+    """Free an email whose user never reached its shard.
+
+    Signup and employee creation commit the directory entry before the shard
+    row, so a crash in between would otherwise hold the email forever.
+    """
+    # Younger entries may belong to a request still writing its shard row
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.DIRECTORY_ORPHAN_GRACE_SECONDS)
+    entry = db.query(UserDirectory.user_id, UserDirectory.company_id).filter(
+        UserDirectory.email == email,
+        UserDirectory.created_at < cutoff
+    ).first()
+    if entry is None:
+        return
+
+    tenant_db = tenant_session(entry.company_id)
+    if tenant_db is not None:
+        try:
+            if tenant_db.query(User.id).filter(User.id == entry.user_id).first() is not None:
+                return
+        finally:
+            tenant_db.close()
+
+    db.query(UserDirectory).filter(UserDirectory.user_id == entry.user_id).delete(synchronize_session=False)
+    db.commit()
+    logger.warning(f"Released the email of user {entry.user_id}, who never reached the shard of company {entry.company_id}")
+
+def pick_shard_for_new_tenant(db: Session) -> str:
+    # Fewest tenants wins; hot tenants are rebalanced afterwards with
+    # python -m app.services.tenant_move rebalance
+    counts = dict(
+        db.query(TenantDirectory.shard, func.count(TenantDirectory.company_id))
+        .group_by(TenantDirectory.shard)
+        .all()
+    )
+    return min(placement_shards, key=lambda name: (counts.get(name, 0), name))
+
+def fan_out(query: Callable[[Session], object]) -> dict:
+    """Run ``query`` against every shard concurrently; returns {shard: result}."""
+    def run(name: str):
+        db = shard_sessions[name]()
+        try:
+            return query(db)
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=len(shard_engines)) as pool:
+        futures = {name: pool.submit(run, name) for name in shard_engines}
+        return {name: future.result() for name, future in futures.items()}
+
+def backfill_directory():
+    """Register tenants that predate the directory. Only runs while the directory is empty."""
+    db = SessionLocal()
+    try:
+        if db.query(TenantDirectory.company_id).first() is not None:
+            return
+
+        for name, make_session in shard_sessions.items():
+            shard_db = make_session()
+            try:
+                companies = shard_db.query(Company.id, Company.name).all()
+                users = shard_db.query(User.id, User.email, User.company_id).filter(User.company_id.isnot(None)).all()
+            finally:
+                shard_db.close()
+
+            for company in companies:
+                db.execute(dialect_insert(db, TenantDirectory).values(
+                    company_id=company.id, name=company.name, shard=name
+                ).on_conflict_do_nothing())
+            for user in users:
+                db.execute(dialect_insert(db, UserDirectory).values(
+                    user_id=user.id, email=user.email, company_id=user.company_id
+                ).on_conflict_do_nothing())
+            if companies:
+                logger.info(f"Registered {len(companies)} existing tenants on shard {name}")
+
+        if db.get_bind().dialect.name == "postgresql":
+            # Explicit ids don't advance the sequences that allocate new ones
+            for table, column in (("tenant_directory", "company_id"), ("user_directory", "user_id")):
+                db.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+                    f"COALESCE((SELECT MAX({column}) FROM {table}), 0) + 1, false)"
+                ))
+        db.commit()
+    finally:
+        db.close()
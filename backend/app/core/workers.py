@@ -0,0 +1,104 @@
+"""Per-worker health, shared through the main database.
+
+Each server worker counts the requests it serves and writes them, with its
+pid and start time, to ``worker_heartbeats`` every SERVER_HEARTBEAT_SECONDS.
+/health reads the table, so it lists every worker no matter which one answers.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal, dialect_insert
+from app.models.worker import WorkerHeartbeat
+
+logger = logging.getLogger("saas_platform")
+
+# Rows this many heartbeats old belong to workers that died without cleaning up
+FORGET_AFTER_HEARTBEATS = 10
+
+class WorkerStatus:
+    def __init__(self):
+        self.started_at: float | None = None
+        self.requests_served = 0
+        self._stopped = threading.Event()
+
+    @property
+    def name(self) -> str:
+        # Read on use, so it is the worker's pid rather than the preloading master's
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self):
+        # Called from a startup hook, so it runs in each worker after the fork
+        self.started_at = time.time()
+        self._stopped.clear()
+        threading.Thread(target=self._run, name="worker-heartbeat", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        db = SessionLocal()
+        try:
+            db.query(WorkerHeartbeat).filter(WorkerHeartbeat.worker == self.name).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.beat()
+            except Exception as e:
+                logger.error(f"Writing the worker heartbeat failed: {str(e)}")
+            self._stopped.wait(settings.SERVER_HEARTBEAT_SECONDS)
+
+    def beat(self):
+        now = time.time()
+        values = {"requests_served": self.requests_served, "heartbeat_at": now}
+        db = SessionLocal()
+        try:
+            stmt = dialect_insert(db, WorkerHeartbeat).values(
+                worker=self.name,
+                hostname=socket.gethostname(),
+                pid=os.getpid(),
+                started_at=self.started_at,
+                **values
+            )
+            db.execute(stmt.on_conflict_do_update(index_elements=[WorkerHeartbeat.worker], set_=values))
+            db.query(WorkerHeartbeat).filter(
+                WorkerHeartbeat.heartbeat_at < now - FORGET_AFTER_HEARTBEATS * settings.SERVER_HEARTBEAT_SECONDS
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+worker_status = WorkerStatus()
+
+def list_workers(db: Session) -> list[dict]:
+    now = time.time()
+    return [
+        {
+            "worker": row.worker,
+            "pid": row.pid,
+            "uptime_seconds": round(now - row.started_at, 1),
+            "requests_served": row.requests_served,
+            "last_seen_seconds": round(now - row.heartbeat_at, 1),
+            # A worker that missed a few heartbeats is hung or gone
+            "alive": now - row.heartbeat_at < 3 * settings.SERVER_HEARTBEAT_SECONDS,
+        }
+        for row in db.query(WorkerHeartbeat).order_by(WorkerHeartbeat.started_at).all()
+    ]
+
+class RequestCounterMiddleware:
+    """ASGI middleware counting the HTTP requests this worker serves."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            worker_status.requests_served += 1
+        await self.app(scope, receive, send)
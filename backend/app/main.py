@@ -1,8 +1,14 @@
-from fastapi import FastAPI
+import os
+
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import auth, companies, users, dashboard, activities, ai
+from app.routers import auth, companies, users, dashboard, activities, ai, profiling, reports
 from app.core.exceptions import setup_exception_handlers
 from app.core.logging import logger
+from app.core.profiler import ProfilingMiddleware, profiler
+from app.core.database import get_db
+from app.core.workers import RequestCounterMiddleware, worker_status, list_workers
+from sqlalchemy.orm import Session
 
 logger.info("Starting SaaS Platform API...")
 
@@ -11,9 +17,34 @@ app = FastAPI(title="Multi-Company Work Management Platform")
 setup_exception_handlers(app)
 
 # Initialize database
-from app.core.database import engine, Base
-from app.models import company, user, activity
-Base.metadata.create_all(bind=engine)
+from app.core.sharding import create_all_tables, backfill_directory
+from app.models import company, user, activity, tenant_deletion, directory
+create_all_tables()
+backfill_directory()
+
+from app.services.tenant_deletion import start_deletion_watchdog
+
+@app.on_event("startup")
+def record_worker_start():
+    # Runs in each worker after the fork, unlike module-level code under preload
+    worker_status.start()
+
+@app.on_event("shutdown")
+def record_worker_stop():
+    worker_status.stop()
+
+@app.on_event("startup")
+def resume_pending_tenant_deletions():
+    start_deletion_watchdog()
+
+@app.on_event("startup")
+def follow_profiling_sessions():
+    # Polls the main database for sessions, slowly while none is running
+    profiler.start_sync()
+
+# One in-memory check per request unless an admin starts a session via /admin/profiling
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(RequestCounterMiddleware)
 
 # 👇 ADD THIS BLOCK
 app.add_middleware(
@@ -30,7 +61,19 @@ app.include_router(users.router)
 app.include_router(dashboard.router)
 app.include_router(activities.router)
 app.include_router(ai.router)
+app.include_router(profiling.router)
+app.include_router(reports.router)
 
 @app.get("/")
 def home():
     return {"message": "Backend is running 🚀"}
+
+@app.get("/health")
+def health(db: Session = Depends(get_db)):
+    # Every worker reports in through the main database, so whichever one
+    # answers can list them all
+    return {
+        "status": "ok",
+        "pid": os.getpid(),
+        "workers": list_workers(db)
+    }
@@ -1,2 +1,7 @@
 from app.models.company import Company
 from app.models.user import User
+from app.models.activity import ActivityLog
+from app.models.tenant_deletion import TenantDeletionJob
+from app.models.directory import TenantDirectory, UserDirectory
+from app.models.profiling import ProfileSessionRecord, ProfileWorkerSamples
+from app.models.worker import WorkerHeartbeat
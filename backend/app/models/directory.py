@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy.sql import func
+from app.core.database import DirectoryBase
+
+class TenantDirectory(DirectoryBase):
+    """Maps a company to its shard. Also allocates company ids and keeps names globally unique."""
+    __tablename__ = "tenant_directory"
+
+    company_id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, nullable=False)
+    shard = Column(String, nullable=False)
+    status = Column(String, default="active") # active, moving, deleting
+    previous_shard = Column(String, nullable=True) # set until a move has cleaned up its source
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class UserDirectory(DirectoryBase):
+    """Email-to-tenant lookup for login. Also allocates user ids and keeps emails globally unique."""
+    __tablename__ = "user_directory"
+
+    user_id = Column(Integer, primary_key=True, index=True)
+    email = Column(String, unique=True, index=True, nullable=False)
+    company_id = Column(Integer, ForeignKey("tenant_directory.company_id"), index=True, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
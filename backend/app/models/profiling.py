@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, String, Float, Text, UniqueConstraint
+from app.core.database import DirectoryBase
+
+class ProfileSessionRecord(DirectoryBase):
+    """The active profiling session, polled by every worker (see app.core.profiler)."""
+    __tablename__ = "profile_sessions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    route = Column(String, nullable=True)
+    company_id = Column(Integer, nullable=True)
+    sample_rate = Column(Float, nullable=False)
+    interval_ms = Column(Float, nullable=False)
+    max_overhead = Column(Float, nullable=False)
+
+    # Epoch seconds, compared against time.time() in each worker
+    started_at = Column(Float, nullable=False)
+    expires_at = Column(Float, nullable=False)
+    stopped_at = Column(Float, nullable=True)
+    stop_reason = Column(String, nullable=True)
+
+class ProfileWorkerSamples(DirectoryBase):
+    """What one worker process sampled during a session; exports merge all rows."""
+    __tablename__ = "profile_worker_samples"
+    __table_args__ = (UniqueConstraint("session_id", "worker"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    # No ForeignKey: a worker may flush just after a new session replaced this one
+    session_id = Column(Integer, index=True, nullable=False)
+    worker = Column(String, nullable=False) # hostname:pid
+
+    requests_profiled = Column(Integer, default=0)
+    samples = Column(Integer, default=0)
+    sampling_seconds = Column(Float, default=0)
+    active_seconds = Column(Float, default=0)
+    stacks = Column(Text, default="[]") # JSON [[route, company_id, [frames root-first], count], ...]
+    categories = Column(Text, default="{}") # JSON {category: count}
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy.sql import func
+from app.core.database import DirectoryBase
+
+class TenantDeletionJob(DirectoryBase):
+    __tablename__ = "tenant_deletion_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # No ForeignKey: the job row must outlive the company it deletes
+    company_id = Column(Integer, index=True, nullable=False)
+    requested_by = Column(Integer, nullable=False)
+
+    status = Column(String, default="pending") # pending, running, completed, failed
+    activity_logs_deleted = Column(Integer, default=0)
+    users_deleted = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    # Bumped by the worker running the job; a stale heartbeat lets another worker take over
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, Float
+from app.core.database import DirectoryBase
+
+class WorkerHeartbeat(DirectoryBase):
+    """One row per running server worker, refreshed by the worker itself (see app.core.workers)."""
+    __tablename__ = "worker_heartbeats"
+
+    worker = Column(String, primary_key=True) # hostname:pid
+    hostname = Column(String, nullable=False)
+    pid = Column(Integer, nullable=False)
+    requests_served = Column(Integer, default=0)
+
+    # Epoch seconds
+    started_at = Column(Float, nullable=False)
+    heartbeat_at = Column(Float, nullable=False)
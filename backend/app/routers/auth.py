@@ -1,14 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import exists
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
 
-from app.core.database import SessionLocal
-from app.core.security import hash_password, verify_password, get_current_user
+from app.core.database import SessionLocal, dialect_insert
+from app.core.sharding import tenant_session, pick_shard_for_new_tenant, release_orphaned_email
+from app.core.security import hash_password, verify_password, get_current_user, load_user
 from app.core.jwt import create_access_token, create_refresh_token
 from app.core.config import settings
+from app.core.exceptions import BaseAPIException
 from app.models.company import Company
 from app.models.user import User
 from app.models.activity import ActivityLog
+from app.models.directory import TenantDirectory, UserDirectory
 from app.schemas.user import SignupRequest, LoginRequest
 from app.schemas.token import Token, TokenRefreshRequest
 
@@ -23,60 +27,120 @@ def get_db():
 
 @router.post("/signup")
 def signup(data: SignupRequest, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.email == data.email).first()
-    if existing_user:
+    # Hash outside the directory transaction so it doesn't hold locks meanwhile
+    password_hash = hash_password(data.password)
+    release_orphaned_email(db, data.email)
+
+    # Company names and emails are unique across shards, so the directory
+    # decides them and allocates the ids the shard rows are written with
+    company_stmt = dialect_insert(db, TenantDirectory).values(
+        name=data.company_name,
+        shard=pick_shard_for_new_tenant(db)
+    ).on_conflict_do_nothing(index_elements=[TenantDirectory.name]).returning(TenantDirectory.company_id)
+    company_id = db.execute(company_stmt).scalar_one_or_none()
+    created_company = company_id is not None
+    if not created_company:
+        # Joins the existing company
+        company = db.query(TenantDirectory.company_id, TenantDirectory.status).filter(
+            TenantDirectory.name == data.company_name
+        ).first()
+        # None if its deletion finished in between
+        if company is None or company.status == "deleting":
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Company is being deleted")
+        company_id = company.company_id
+
+    # The unique index on email decides duplicates, so two concurrent
+    # signups can't both get through
+    user_stmt = dialect_insert(db, UserDirectory).values(
+        email=data.email,
+        company_id=company_id
+    ).on_conflict_do_nothing(index_elements=[UserDirectory.email]).returning(UserDirectory.user_id)
+    user_id = db.execute(user_stmt).scalar_one_or_none()
+    if user_id is None:
+        # Also rolls back a company created above, so no orphans are left
+        db.rollback()
         raise HTTPException(status_code=400, detail="Email already registered")
+    db.commit()
 
-    company = db.query(Company).filter(Company.name == data.company_name).first()
-
-    if not company:
-        company = Company(name=data.company_name)
-        db.add(company)
+    tenant_db = tenant_session(company_id)
+    try:
+        tenant_db.execute(dialect_insert(tenant_db, Company).values(
+            id=company_id,
+            name=data.company_name
+        ).on_conflict_do_nothing())
+        tenant_db.add(User(
+            id=user_id,
+            email=data.email,
+            password_hash=password_hash,
+            role="COMPANY_ADMIN",
+            company_id=company_id
+        ))
+        tenant_db.commit()
+    except Exception:
+        tenant_db.rollback()
+        # Release the email, and the company name if this signup claimed it,
+        # so the signup can be retried
+        db.query(UserDirectory).filter(UserDirectory.user_id == user_id).delete(synchronize_session=False)
+        if created_company:
+            # Unless another signup has joined the company meanwhile
+            db.query(TenantDirectory).filter(
+                TenantDirectory.company_id == company_id,
+                ~exists().where(UserDirectory.company_id == company_id)
+            ).delete(synchronize_session=False)
         db.commit()
-        db.refresh(company)
-
-    user = User(
-        email=data.email,
-        password_hash=hash_password(data.password),
-        role="COMPANY_ADMIN",
-        company_id=company.id
-    )
-
-    db.add(user)
-    db.commit()
+        raise
+    finally:
+        tenant_db.close()
 
     return {"message": "Signup successful"}
 
 @router.post("/login", response_model=Token)
 def login(data: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == data.email).first()
-    if not user or not verify_password(data.password, user.password_hash):
+    # The directory says which shard holds this user
+    entry = db.query(UserDirectory).filter(UserDirectory.email == data.email).first()
+    tenant_db = tenant_session(entry.company_id) if entry else None
+    if tenant_db is None:
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
-    payload = {
-        "user_id": user.id,
-        "email": user.email,
-        "role": user.role,
-        "company_id": user.company_id
-    }
-
-    access_token = create_access_token(payload)
-    refresh_token = create_refresh_token(payload)
-
-    # Log the action
-    log = ActivityLog(
-        user_id=user.id,
-        company_id=user.company_id,
-        action="USER_LOGIN",
-        details=f"User {user.email} logged in"
-    )
-    db.add(log)
-    db.commit()
+    try:
+        user = load_user(tenant_db, entry.user_id)
+        if not user or not verify_password(data.password, user.password_hash):
+            raise HTTPException(status_code=400, detail="Invalid credentials")
+
+        payload = {
+            "user_id": user.id,
+            "email": user.email,
+            "role": user.role,
+            "company_id": user.company_id
+        }
+
+        access_token = create_access_token(payload)
+        refresh_token = create_refresh_token(payload)
+
+        # Log the action
+        log = ActivityLog(
+            user_id=user.id,
+            company_id=user.company_id,
+            action="USER_LOGIN",
+            details=f"User {user.email} logged in"
+        )
+        tenant_db.add(log)
+        try:
+            tenant_db.commit()
+        except BaseAPIException as e:
+            # Refused while a move pauses the tenant's writes; the login itself
+            # only needed to read, so it shouldn't fail over its audit record
+            if e.status_code != 503:
+                raise
+            tenant_db.rollback()
+    finally:
+        tenant_db.close()
 
     return Token(access_token=access_token, refresh_token=refresh_token)
 
 @router.post("/refresh", response_model=Token)
-def refresh_token(data: TokenRefreshRequest, db: Session = Depends(get_db)):
+def refresh_token(data: TokenRefreshRequest):
     try:
         payload = jwt.decode(
             data.refresh_token,
@@ -93,7 +157,13 @@ def refresh_token(data: TokenRefreshRequest, db: Session = Depends(get_db)):
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
 
-    user = db.query(User).filter(User.id == user_id).first()
+    tenant_db = tenant_session(payload.get("company_id"))
+    if tenant_db is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    try:
+        user = load_user(tenant_db, user_id)
+    finally:
+        tenant_db.close()
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
 
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from app.core.database import SessionLocal
-from app.core.security import require_roles
+from app.core.security import require_roles, get_token_payload, get_tenant_db
 from app.models.user import User
 from app.models.company import Company
 from app.models.activity import ActivityLog
-from app.schemas.company import CompanyResponse, CompanyUpdate
+from app.models.directory import TenantDirectory
+from app.models.tenant_deletion import TenantDeletionJob
+from app.schemas.company import CompanyResponse, CompanyUpdate, TenantDeletionJobResponse
+from app.services.tenant_deletion import start_tenant_deletion, run_tenant_deletion
 
 router = APIRouter(prefix="/companies", tags=["Companies"])
 
@@ -19,7 +23,7 @@ def get_db():
 @router.get("/me", response_model=CompanyResponse)
 def get_my_company(
     current_user: User = Depends(require_roles(["COMPANY_ADMIN", "EMPLOYEE"])),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     company = db.query(Company).filter(Company.id == current_user.company_id).first()
     if not company:
@@ -30,26 +34,34 @@ def get_my_company(
 def update_my_company(
     data: CompanyUpdate,
     current_user: User = Depends(require_roles(["COMPANY_ADMIN"])),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db),
+    directory_db: Session = Depends(get_db)
 ):
     company = db.query(Company).filter(Company.id == current_user.company_id).first()
     if not company:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Company not found")
 
-    if data.name is not None:
-        # Check uniqueness
-        existing = db.query(Company).filter(Company.name == data.name, Company.id != company.id).first()
-        if existing:
+    if data.status == "deleting":
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Use DELETE /companies/me to delete the company")
+
+    old_name = company.name
+    renamed = data.name is not None and data.name != old_name
+    if renamed:
+        # Names are unique across shards, so the directory's unique index decides
+        try:
+            directory_db.query(TenantDirectory).filter(
+                TenantDirectory.company_id == company.id
+            ).update({"name": data.name}, synchronize_session=False)
+            directory_db.commit()
+        except IntegrityError:
+            directory_db.rollback()
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Company name already taken")
         company.name = data.name
     
     if data.status is not None:
         company.status = data.status
 
-    db.commit()
-    db.refresh(company)
-
-    # Log the action
+    # Log the action in the same transaction as the update
     log = ActivityLog(
         user_id=current_user.id,
         company_id=current_user.company_id,
@@ -57,32 +69,51 @@ def update_my_company(
         details=f"Company profile updated"
     )
     db.add(log)
-    db.commit()
+
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        # Give the name back if the shard didn't take the rename
+        if renamed:
+            directory_db.query(TenantDirectory).filter(
+                TenantDirectory.company_id == current_user.company_id
+            ).update({"name": old_name}, synchronize_session=False)
+            directory_db.commit()
+        raise
+
+    db.refresh(company)
     return company
 
-@router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/me", response_model=TenantDeletionJobResponse, status_code=status.HTTP_202_ACCEPTED)
 def delete_my_company(
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(require_roles(["COMPANY_ADMIN"])),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db),
+    directory_db: Session = Depends(get_db)
 ):
     company = db.query(Company).filter(Company.id == current_user.company_id).first()
     if not company:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Company not found")
 
-    # This would cascade delete users if configured in models, 
-    # but for safety we just log and change status instead of hard delete in production.
-    # For now, hard delete:
-    # For now, hard delete:
-    db.delete(company)
+    # Users and activity logs are removed in batches by a background job;
+    # deleting a large tenant inline would hold locks and time out.
+    job = start_tenant_deletion(directory_db, db, company, requested_by=current_user.id)
+    background_tasks.add_task(run_tenant_deletion, job.id)
+    return job
 
-    # Log the action
-    log = ActivityLog(
-        user_id=current_user.id,
-        company_id=current_user.company_id,
-        action="COMPANY_DELETED",
-        details=f"Company profile deleted"
-    )
-    db.add(log)
-
-    db.commit()
-    return None
+@router.get("/deletion-jobs/{job_id}", response_model=TenantDeletionJobResponse)
+def get_deletion_job(
+    job_id: int,
+    payload: dict = Depends(get_token_payload),
+    db: Session = Depends(get_db)
+):
+    # Authorized from the token claims alone, since the requesting
+    # admin's user row is removed while the job runs
+    job = db.query(TenantDeletionJob).filter(
+        TenantDeletionJob.id == job_id,
+        TenantDeletionJob.company_id == payload.get("company_id")
+    ).first()
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deletion job not found")
+    return job
@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse, JSONResponse
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.core.profiler import (
+    profiler, ProfileSession, start_session, stop_session, load_session,
+    collapsed_stacks, speedscope_profile
+)
+from app.core.security import require_platform_admin
+from app.models.user import User
+from app.schemas.profiling import ProfileStartRequest, ProfileStatusResponse
+
+router = APIRouter(prefix="/admin/profiling", tags=["Profiling"])
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_session(db: Session) -> ProfileSession:
+    # Includes what other workers flushed during their last sync
+    profiler.sync()
+    session = load_session(db)
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No profiling session")
+    return session
+
+@router.post("/start", response_model=ProfileStatusResponse)
+def start_profiling(
+    data: ProfileStartRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_platform_admin)
+):
+    # This worker joins right away, the others within PROFILE_IDLE_SYNC_SECONDS
+    start_session(
+        db,
+        route=data.route,
+        company_id=data.company_id,
+        sample_rate=data.sample_rate,
+        interval_ms=data.interval_ms,
+        duration_seconds=data.duration_seconds,
+        max_overhead=data.max_overhead
+    )
+    return get_session(db).to_dict()
+
+@router.post("/stop", response_model=ProfileStatusResponse)
+def stop_profiling(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_platform_admin)
+):
+    if stop_session(db) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No profiling session")
+    return get_session(db).to_dict()
+
+@router.get("/status", response_model=ProfileStatusResponse)
+def get_profiling_status(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_platform_admin)
+):
+    return get_session(db).to_dict()
+
+@router.get("/flamegraph", response_class=PlainTextResponse)
+def get_flamegraph(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_platform_admin)
+):
+    # Feed to flamegraph.pl or paste into speedscope
+    return collapsed_stacks(get_session(db))
+
+@router.get("/speedscope")
+def get_speedscope(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_platform_admin)
+):
+    return JSONResponse(
+        speedscope_profile(get_session(db)),
+        headers={"Content-Disposition": 'attachment; filename="profile.speedscope.json"'}
+    )
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends
+from typing import List
+
+from app.core.security import require_platform_admin
+from app.models.user import User
+from app.schemas.reports import TenantUsage, ShardUsage
+from app.services.tenant_move import tenant_report
+
+router = APIRouter(prefix="/admin/reports", tags=["Admin Reports"])
+
+@router.get("/tenants", response_model=List[TenantUsage])
+def get_tenant_usage(current_user: User = Depends(require_platform_admin)):
+    # Gathered from every shard in parallel, largest tenants first
+    return tenant_report()
+
+@router.get("/shards", response_model=List[ShardUsage])
+def get_shard_usage(current_user: User = Depends(require_platform_admin)):
+    totals = {}
+    for row in tenant_report():
+        shard = totals.setdefault(row["shard"], {"shard": row["shard"], "tenants": 0, "users": 0, "activity_logs": 0})
+        shard["tenants"] += 1
+        shard["users"] += row["users"]
+        shard["activity_logs"] += row["activity_logs"]
+    return list(totals.values())
@@ -2,10 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
 
-from app.core.database import SessionLocal
-from app.core.security import require_roles, hash_password
+from app.core.database import SessionLocal, dialect_insert
+from app.core.security import require_roles, hash_password, get_tenant_db
+from app.core.sharding import release_orphaned_email
 from app.models.user import User
 from app.models.activity import ActivityLog
+from app.models.directory import UserDirectory
 from app.schemas.user import EmployeeResponse, EmployeeCreate, EmployeeUpdate
 
 router = APIRouter(prefix="/users", tags=["Employees"])
@@ -20,7 +22,7 @@ def get_db():
 @router.get("/", response_model=List[EmployeeResponse])
 def get_employees(
     current_user: User = Depends(require_roles(["COMPANY_ADMIN"])),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     users = db.query(User).filter(User.company_id == current_user.company_id).all()
     return users
@@ -29,26 +31,37 @@ def get_employees(
 def create_employee(
     data: EmployeeCreate,
     current_user: User = Depends(require_roles(["COMPANY_ADMIN"])),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db),
+    directory_db: Session = Depends(get_db)
 ):
-    existing_user = db.query(User).filter(User.email == data.email).first()
-    if existing_user:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
-
     if data.role not in ["COMPANY_ADMIN", "EMPLOYEE"]:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid role")
 
+    password_hash = hash_password(data.password)
+    release_orphaned_email(directory_db, data.email)
+
+    # Emails are unique across shards: the directory's unique index rejects
+    # duplicates and allocates the user id, no SELECT beforehand
+    stmt = dialect_insert(directory_db, UserDirectory).values(
+        email=data.email,
+        company_id=current_user.company_id
+    ).on_conflict_do_nothing(index_elements=[UserDirectory.email]).returning(UserDirectory.user_id)
+    user_id = directory_db.execute(stmt).scalar_one_or_none()
+    if user_id is None:
+        directory_db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
+    directory_db.commit()
+
     new_user = User(
+        id=user_id,
         email=data.email,
-        password_hash=hash_password(data.password),
+        password_hash=password_hash,
         role=data.role,
         company_id=current_user.company_id
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    
-    # Log the action
+
+    # Log the action in the same transaction
     log = ActivityLog(
         user_id=current_user.id,
         company_id=current_user.company_id,
@@ -56,8 +69,16 @@ def create_employee(
         details=f"Employee {new_user.email} added with role {new_user.role}"
     )
     db.add(log)
-    db.commit()
-    
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        # Release the email so the request can be retried
+        directory_db.query(UserDirectory).filter(UserDirectory.user_id == user_id).delete(synchronize_session=False)
+        directory_db.commit()
+        raise
+
+    db.refresh(new_user)
     return new_user
 
 @router.put("/{user_id}", response_model=EmployeeResponse)
@@ -65,7 +86,7 @@ def update_employee_role(
     user_id: int,
     data: EmployeeUpdate,
     current_user: User = Depends(require_roles(["COMPANY_ADMIN"])),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     user = db.query(User).filter(User.id == user_id, User.company_id == current_user.company_id).first()
     if not user:
@@ -93,7 +114,8 @@ def update_employee_role(
 def delete_employee(
     user_id: int,
     current_user: User = Depends(require_roles(["COMPANY_ADMIN"])),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db),
+    directory_db: Session = Depends(get_db)
 ):
     user = db.query(User).filter(User.id == user_id, User.company_id == current_user.company_id).first()
     if not user:
@@ -113,4 +135,8 @@ def delete_employee(
     )
     db.add(log)
     db.commit()
+
+    # Frees the email for reuse once the shard no longer has the user
+    directory_db.query(UserDirectory).filter(UserDirectory.user_id == user_id).delete(synchronize_session=False)
+    directory_db.commit()
     return None
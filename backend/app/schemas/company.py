@@ -16,3 +16,16 @@ class CompanyResponse(CompanyBase):
     
     class Config:
         from_attributes = True
+
+class TenantDeletionJobResponse(BaseModel):
+    id: int
+    company_id: int
+    status: str
+    activity_logs_deleted: int
+    users_deleted: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
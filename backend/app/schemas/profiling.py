@@ -0,0 +1,27 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class ProfileStartRequest(BaseModel):
+    route: Optional[str] = None      # path prefix, e.g. "/users"
+    company_id: Optional[int] = None
+    sample_rate: float = Field(0.1, gt=0, le=1)           # fraction of matching requests
+    interval_ms: float = Field(10, ge=1, le=1000)
+    duration_seconds: int = Field(60, ge=1, le=600)       # auto-disable after this
+    max_overhead: float = Field(0.02, gt=0, le=0.2)       # sampler time / profiled time
+
+class ProfileStatusResponse(BaseModel):
+    active: bool
+    route: Optional[str] = None
+    company_id: Optional[int] = None
+    sample_rate: float
+    interval_ms: float
+    max_overhead: float
+    started_at: float
+    expires_at: float
+    stopped_at: Optional[float] = None
+    stop_reason: Optional[str] = None
+    workers: int                     # worker processes that reported samples
+    requests_profiled: int
+    samples: int
+    overhead: float
+    categories: dict[str, int]
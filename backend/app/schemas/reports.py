@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+
+class TenantUsage(BaseModel):
+    company_id: int
+    name: str
+    shard: str
+    status: str
+    users: int
+    activity_logs: int
+
+class ShardUsage(BaseModel):
+    shard: str
+    tenants: int
+    users: int
+    activity_logs: int
@@ -0,0 +1,100 @@
+"""Production entry point: ``python -m app.serve``.
+
+Runs the app under gunicorn with uvicorn workers. The app is preloaded in the
+master so workers share its memory copy-on-write, workers are recycled after
+SERVER_MAX_REQUESTS, and ``kill -HUP <master pid>`` replaces them gracefully.
+HUP does not load new code (workers fork from the preloaded app), so deploys
+need a full restart.
+"""
+import logging
+import math
+import os
+
+from gunicorn.app.base import BaseApplication
+from uvicorn_worker import UvicornWorker
+
+from app.core.config import settings
+
+logger = logging.getLogger("saas_platform")
+
+def _cgroup_cpu_limit() -> float | None:
+    # cgroup v2
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+
+    # cgroup v1
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+def available_cpus() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(cpus, 1)
+
+def worker_count() -> int:
+    if settings.SERVER_WORKERS > 0:
+        return settings.SERVER_WORKERS
+    # Async workers are not blocked on I/O, so one per core saturates the CPU
+    return available_cpus()
+
+class Worker(UvicornWorker):
+    # "auto" picks uvloop and httptools when installed, else asyncio and h11
+    CONFIG_KWARGS = {"loop": "auto", "http": "auto", "lifespan": "on"}
+
+def post_fork(server, worker):
+    # Connections opened while preloading must not be shared across processes
+    from app.core.sharding import dispose_engines
+    dispose_engines()
+
+class Server(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app.main import app
+        return app
+
+def main():
+    options = {
+        "bind": f"{settings.SERVER_HOST}:{settings.SERVER_PORT}",
+        "workers": worker_count(),
+        "worker_class": "app.serve.Worker",
+        "preload_app": True,
+        "post_fork": post_fork,
+        "max_requests": settings.SERVER_MAX_REQUESTS,
+        "max_requests_jitter": settings.SERVER_MAX_REQUESTS_JITTER,
+        "timeout": settings.SERVER_TIMEOUT,
+        "graceful_timeout": settings.SERVER_GRACEFUL_TIMEOUT,
+        "keepalive": settings.SERVER_KEEPALIVE,
+        "accesslog": "-",
+    }
+    logger.info(f"Starting {options['workers']} workers on {options['bind']}")
+    Server(options).run()
+
+if __name__ == "__main__":
+    main()
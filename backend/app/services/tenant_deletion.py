@@ -0,0 +1,216 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.exceptions import BaseAPIException
+from app.core.sharding import shard_sessions, forget_company
+from app.models.activity import ActivityLog
+from app.models.company import Company
+from app.models.directory import TenantDirectory, UserDirectory
+from app.models.tenant_deletion import TenantDeletionJob
+from app.models.user import User
+
+logger = logging.getLogger("saas_platform")
+
+ACTIVE_JOB_STATUSES = ("pending", "running")
+
+def start_tenant_deletion(db: Session, tenant_db: Session, company: Company, requested_by: int) -> TenantDeletionJob:
+    # Reuse an in-flight job so repeated requests don't start parallel deletions
+    job = db.query(TenantDeletionJob).filter(
+        TenantDeletionJob.company_id == company.id,
+        TenantDeletionJob.status.in_(ACTIVE_JOB_STATUSES)
+    ).first()
+    if job:
+        return job
+
+    # Claimed in the directory together with recording the job, so the tenant
+    # can't be moved meanwhile (move_tenant only takes active tenants)
+    claimed = db.query(TenantDirectory).filter(
+        TenantDirectory.company_id == company.id,
+        TenantDirectory.status == "active"
+    ).update({"status": "deleting"}, synchronize_session=False)
+    if not claimed:
+        db.rollback()
+        raise BaseAPIException("Tenant is being moved, please retry shortly", status_code=503)
+
+    # The job is recorded first: if we crash before the company is marked,
+    # the job still gets resumed on startup and finishes the deletion
+    job = TenantDeletionJob(company_id=company.id, requested_by=requested_by)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    # Marking the company locks its users out immediately (see load_user). The
+    # tenant's own sessions refuse writes from now on, so a plain one is used.
+    shard_db = shard_sessions[tenant_db.info["shard"]]()
+    try:
+        shard_db.query(Company).filter(Company.id == company.id).update(
+            {"status": "deleting"}, synchronize_session=False
+        )
+        shard_db.commit()
+    except Exception:
+        shard_db.rollback()
+        # The client is told the request failed, so nothing may delete the tenant later
+        db.delete(job)
+        db.query(TenantDirectory).filter(TenantDirectory.company_id == company.id).update(
+            {"status": "active"}, synchronize_session=False
+        )
+        db.commit()
+        raise
+    finally:
+        shard_db.close()
+    return job
+
+def delete_in_batches(db: Session, model, company_id: int, on_batch=None) -> int:
+    """Delete a tenant's rows of ``model`` in committed, throttled batches."""
+    pk = model.__mapper__.primary_key[0]
+    total = 0
+    while True:
+        ids = [
+            row[0] for row in db.query(pk)
+            .filter(model.company_id == company_id)
+            .order_by(pk)
+            .limit(settings.TENANT_DELETE_BATCH_SIZE)
+            .all()
+        ]
+        if not ids:
+            return total
+        db.query(model).filter(pk.in_(ids)).delete(synchronize_session=False)
+        total += len(ids)
+        db.commit()
+        if on_batch:
+            on_batch(len(ids))
+        time.sleep(settings.TENANT_DELETE_THROTTLE_SECONDS)
+
+def _claim_job(db: Session, job_id: int, retry_failed: bool) -> bool:
+    # A single conditional UPDATE, so only one worker wins a job. Running jobs
+    # are only taken over once their runner has stopped heartbeating.
+    now = datetime.now(timezone.utc)
+    stale_before = now - timedelta(seconds=settings.TENANT_DELETE_STALE_SECONDS)
+    claimable = ["pending", "failed"] if retry_failed else ["pending"]
+    claimed = db.query(TenantDeletionJob).filter(
+        TenantDeletionJob.id == job_id,
+        or_(
+            TenantDeletionJob.status.in_(claimable),
+            and_(
+                TenantDeletionJob.status == "running",
+                or_(TenantDeletionJob.heartbeat_at.is_(None), TenantDeletionJob.heartbeat_at < stale_before)
+            )
+        )
+    ).update({"status": "running", "heartbeat_at": now, "error": None}, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+def run_tenant_deletion(job_id: int, retry_failed: bool = False) -> None:
+    """Delete a tenant's activity logs, users and company row in bounded batches.
+
+    Every batch is committed on its own, so the job can be re-run after a crash
+    and simply continues with whatever rows are left.
+    """
+    db = SessionLocal()
+    try:
+        if not _claim_job(db, job_id, retry_failed):
+            return
+        job = db.query(TenantDeletionJob).filter(TenantDeletionJob.id == job_id).first()
+
+        def heartbeat(count=0, counter=None):
+            if counter:
+                setattr(job, counter, getattr(job, counter) + count)
+            job.heartbeat_at = datetime.now(timezone.utc)
+            db.commit()
+
+        def directory_entry():
+            # Read from the directory itself, not the cache. None once a
+            # previous run got as far as removing the entry.
+            return db.query(TenantDirectory.shard, TenantDirectory.status).filter(
+                TenantDirectory.company_id == job.company_id
+            ).first()
+
+        entry = directory_entry()
+        # Only jobs recorded before the directory tracked deletions can meet a
+        # move; rows must not be deleted from under its copy
+        while entry is not None and entry.status == "moving":
+            heartbeat()
+            time.sleep(settings.TENANT_DELETE_STALE_SECONDS / 4)
+            entry = directory_entry()
+
+        if entry is not None:
+            # Lets writes that passed the commit check before the tenant was
+            # marked, or trusted a route cached as active, land first
+            time.sleep(settings.TENANT_MOVE_GRACE_SECONDS + settings.TENANT_DIRECTORY_CACHE_SECONDS)
+            tenant_db = shard_sessions[entry.shard]()
+            try:
+                # Logs reference users, so they have to go first. Job counters
+                # are committed after each batch so progress survives a crash.
+                # Passes repeat until one finds nothing, so rows written by
+                # requests that were already in flight are swept up too.
+                while True:
+                    deleted = 0
+                    for model, counter in ((ActivityLog, "activity_logs_deleted"), (User, "users_deleted")):
+                        deleted += delete_in_batches(
+                            tenant_db, model, job.company_id,
+                            on_batch=lambda count, counter=counter: heartbeat(count, counter)
+                        )
+                    if not deleted:
+                        break
+
+                tenant_db.query(Company).filter(Company.id == job.company_id).delete(synchronize_session=False)
+                tenant_db.commit()
+            finally:
+                tenant_db.close()
+
+            delete_in_batches(db, UserDirectory, job.company_id, on_batch=lambda count: heartbeat())
+            db.query(TenantDirectory).filter(TenantDirectory.company_id == job.company_id).delete(synchronize_session=False)
+            forget_company(job.company_id)
+
+        job.status = "completed"
+        job.finished_at = func.now()
+        db.commit()
+        logger.info(f"Tenant deletion job {job.id} completed for company {job.company_id}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Tenant deletion job {job_id} failed: {str(e)}", exc_info=True)
+        job = db.query(TenantDeletionJob).filter(TenantDeletionJob.id == job_id).first()
+        if job:
+            job.status = "failed"
+            job.error = str(e)
+            db.commit()
+    finally:
+        db.close()
+
+def resume_tenant_deletions(retry_failed: bool = False) -> None:
+    # Picks up pending jobs and running jobs whose worker died (crash, restart,
+    # recycling); _claim_job makes sure each one is run by a single worker
+    statuses = list(ACTIVE_JOB_STATUSES) + (["failed"] if retry_failed else [])
+    db = SessionLocal()
+    try:
+        job_ids = [
+            row[0] for row in db.query(TenantDeletionJob.id)
+            .filter(TenantDeletionJob.status.in_(statuses))
+            .all()
+        ]
+    finally:
+        db.close()
+
+    for job_id in job_ids:
+        threading.Thread(target=run_tenant_deletion, args=(job_id, retry_failed), daemon=True).start()
+
+def _watch_tenant_deletions():
+    # Failed jobs are retried once per worker start; stale ones whenever seen
+    resume_tenant_deletions(retry_failed=True)
+    while True:
+        time.sleep(settings.TENANT_DELETE_STALE_SECONDS / 2)
+        try:
+            resume_tenant_deletions()
+        except Exception as e:
+            logger.error(f"Checking for stalled tenant deletions failed: {str(e)}")
+
+def start_deletion_watchdog() -> None:
+    # Runs in every worker, so a job survives its worker being recycled or reloaded
+    threading.Thread(target=_watch_tenant_deletions, name="tenant-deletion-watchdog", daemon=True).start()
@@ -0,0 +1,302 @@
+"""Online tenant moves between shards, rebalancing and cross-shard reports.
+
+Usage:
+    python -m app.services.tenant_move report
+    python -m app.services.tenant_move move <company_id> <shard>
+    python -m app.services.tenant_move rebalance [--apply] [--max-moves N]
+
+A move copies the tenant's rows while it keeps working, in rounds that each
+pick up what was written meanwhile. Only the last, short round refuses its
+writes with a 503 (see TenantSession in app.core.sharding).
+"""
+import argparse
+import logging
+import time
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal, dialect_insert
+from app.core.sharding import shard_sessions, placement_shards, fan_out, forget_company
+from app.models.activity import ActivityLog
+from app.models.company import Company
+from app.models.directory import TenantDirectory
+from app.models.tenant_deletion import TenantDeletionJob
+from app.models.user import User
+from app.services.tenant_deletion import ACTIVE_JOB_STATUSES, delete_in_batches
+
+logger = logging.getLogger("saas_platform")
+
+# Copy rounds run while the tenant keeps writing, before its writes are paused
+MAX_LIVE_COPY_ROUNDS = 5
+
+def _delete_tenant_rows(db: Session, company_id: int):
+    # Logs reference users, so they have to go first
+    for model in (ActivityLog, User):
+        delete_in_batches(db, model, company_id)
+    db.query(Company).filter(Company.id == company_id).delete(synchronize_session=False)
+    db.commit()
+
+def _upsert(db: Session, model, values: list[dict]):
+    # Rows copied by an earlier round are overwritten, which picks up updates
+    table = model.__table__
+    stmt = dialect_insert(db, model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={column.name: stmt.excluded[column.name] for column in table.columns if column.name != "id"}
+    )
+    db.execute(stmt, values)
+
+def _copy_table(
+    source_db: Session,
+    target_db: Session,
+    model,
+    company_id: int,
+    after_id: int = 0,
+    up_to_id: int | None = None,
+    keep_ids: bool = True
+) -> tuple[int, int]:
+    """Copy rows with ids in (after_id, up_to_id]; returns (rows copied, last id)."""
+    table = model.__table__
+    last_id = after_id
+    copied = 0
+    while True:
+        query = select(table).where(table.c.company_id == company_id, table.c.id > last_id)
+        if up_to_id is not None:
+            query = query.where(table.c.id <= up_to_id)
+        rows = source_db.execute(
+            query.order_by(table.c.id).limit(settings.TENANT_MOVE_BATCH_SIZE)
+        ).mappings().all()
+        if not rows:
+            return copied, last_id
+
+        last_id = rows[-1]["id"]
+        values = [dict(row) for row in rows]
+        if keep_ids:
+            _upsert(target_db, model, values)
+        else:
+            # Per-shard sequences would collide; nothing outside refers to these ids
+            for row in values:
+                del row["id"]
+            target_db.execute(insert(table), values)
+        target_db.commit()
+        copied += len(values)
+        time.sleep(settings.TENANT_DELETE_THROTTLE_SECONDS)
+
+def _copy_round(company_id: int, source: str, target: str, last_log_id: int | None) -> tuple[int, int]:
+    """Bring the target up to date with the source; returns (logs copied, last log id).
+
+    Companies and users are few and copied in full each round, so updates
+    reach the target too. Activity logs are append-only, so only those after
+    ``last_log_id`` are copied; None starts the copy from scratch.
+    """
+    source_db = shard_sessions[source]()
+    target_db = shard_sessions[target]()
+    try:
+        if last_log_id is None:
+            # Leftovers from an interrupted attempt are cleared, so a move can simply be rerun
+            _delete_tenant_rows(target_db, company_id)
+            last_log_id = 0
+
+        # Logs up to here only reference users that exist by now, so copying
+        # users first keeps foreign keys satisfied on the target
+        log_cutoff = source_db.query(func.max(ActivityLog.id)).filter(
+            ActivityLog.company_id == company_id
+        ).scalar() or last_log_id
+
+        company = source_db.execute(
+            select(Company.__table__).where(Company.id == company_id)
+        ).mappings().first()
+        if company:
+            _upsert(target_db, Company, [dict(company)])
+            target_db.commit()
+
+        # User ids are global (allocated by the directory) and live on in issued tokens
+        users, _ = _copy_table(source_db, target_db, User, company_id)
+        source_user_ids = [row[0] for row in source_db.query(User.id).filter(User.company_id == company_id).all()]
+        target_db.query(User).filter(
+            User.company_id == company_id,
+            User.id.notin_(source_user_ids)
+        ).delete(synchronize_session=False)
+        target_db.commit()
+
+        logs, last_log_id = _copy_table(
+            source_db, target_db, ActivityLog, company_id,
+            after_id=last_log_id, up_to_id=log_cutoff, keep_ids=False
+        )
+        logger.info(f"Copied company {company_id} from {source} to {target}: {users} users, {logs} activity logs")
+        return logs, last_log_id
+    finally:
+        source_db.close()
+        target_db.close()
+
+def _discard_copy(company_id: int, target: str):
+    target_db = shard_sessions[target]()
+    try:
+        _delete_tenant_rows(target_db, company_id)
+    finally:
+        target_db.close()
+
+def move_tenant(company_id: int, target: str):
+    if target not in shard_sessions:
+        raise ValueError(f"Unknown shard: {target}")
+
+    db = SessionLocal()
+    try:
+        entry = db.query(TenantDirectory).filter(TenantDirectory.company_id == company_id).first()
+        if entry is None:
+            raise ValueError(f"Unknown company: {company_id}")
+
+        if entry.shard != target:
+            source = entry.shard
+            if entry.status != "active":
+                raise ValueError(f"Company {company_id} is being deleted or moved")
+
+            # The bulk of the rows is copied while the tenant keeps writing to
+            # the source; each round picks up what was written meanwhile
+            last_log_id = None
+            for _ in range(MAX_LIVE_COPY_ROUNDS):
+                logs, last_log_id = _copy_round(company_id, source, target, last_log_id)
+                if logs < settings.TENANT_MOVE_BATCH_SIZE:
+                    break
+
+            # Claimed like start_tenant_deletion claims it, so a move and a
+            # deletion never overlap; the job check covers jobs that predate it
+            claimed = db.query(TenantDirectory).filter(
+                TenantDirectory.company_id == company_id,
+                TenantDirectory.status == "active"
+            ).update({"status": "moving"}, synchronize_session=False)
+            deleting = db.query(TenantDeletionJob.id).filter(
+                TenantDeletionJob.company_id == company_id,
+                TenantDeletionJob.status.in_(ACTIVE_JOB_STATUSES)
+            ).first()
+            if not claimed or deleting:
+                db.rollback()
+                _discard_copy(company_id, target)
+                raise ValueError(f"Company {company_id} is being deleted or moved")
+            db.commit()
+            # Lets writes that passed the commit check just before the flag land
+            # first, including those that trusted a route cached as active
+            time.sleep(settings.TENANT_MOVE_GRACE_SECONDS + settings.TENANT_DIRECTORY_CACHE_SECONDS)
+
+            try:
+                # Only what was written since the last round, while writes are refused
+                _copy_round(company_id, source, target, last_log_id)
+            except Exception:
+                # The source is untouched, so the tenant can go back to normal
+                entry.status = "active"
+                db.commit()
+                raise
+
+            entry.shard = target
+            entry.previous_shard = source
+            entry.status = "active"
+            db.commit()
+            forget_company(company_id)
+            # Other workers may read from the source until their cached routes expire
+            time.sleep(settings.TENANT_DIRECTORY_CACHE_SECONDS)
+
+        # Also finishes the cleanup of a move that crashed after switching shards
+        if entry.previous_shard and entry.previous_shard != entry.shard:
+            source_db = shard_sessions[entry.previous_shard]()
+            try:
+                _delete_tenant_rows(source_db, company_id)
+            finally:
+                source_db.close()
+        entry.previous_shard = None
+        db.commit()
+        logger.info(f"Company {company_id} now lives on shard {target}")
+    finally:
+        db.close()
+
+def tenant_report() -> list[dict]:
+    """Per-tenant row counts gathered from all shards in parallel."""
+    db = SessionLocal()
+    try:
+        directory = {row.company_id: row for row in db.query(TenantDirectory).all()}
+    finally:
+        db.close()
+
+    def count(shard_db: Session):
+        users = dict(shard_db.query(User.company_id, func.count(User.id)).group_by(User.company_id).all())
+        logs = dict(shard_db.query(ActivityLog.company_id, func.count(ActivityLog.id)).group_by(ActivityLog.company_id).all())
+        return users, logs
+
+    report = []
+    for shard, (users, logs) in fan_out(count).items():
+        for company_id in set(users) | set(logs):
+            entry = directory.get(company_id)
+            # Skip copies that a move has not cleaned up yet
+            if entry is None or entry.shard != shard:
+                continue
+            report.append({
+                "company_id": company_id,
+                "name": entry.name,
+                "shard": shard,
+                "status": entry.status,
+                "users": users.get(company_id, 0),
+                "activity_logs": logs.get(company_id, 0),
+            })
+    return sorted(report, key=lambda row: row["activity_logs"], reverse=True)
+
+def plan_rebalance(report: list[dict], max_moves: int = 5) -> list[dict]:
+    """Greedy plan moving hot tenants (by activity log volume) to the lightest shard."""
+    load = {name: 0 for name in shard_sessions}
+    for row in report:
+        load[row["shard"]] = load.get(row["shard"], 0) + row["activity_logs"]
+
+    tenants = [dict(row) for row in report]
+    moves = []
+    while len(moves) < max_moves:
+        heaviest = max(load, key=load.get)
+        # Like new tenants, moved ones never go back to the main database
+        lightest = min(placement_shards, key=load.get)
+        gap = load[heaviest] - load[lightest]
+
+        # Moving a tenant only helps if it is smaller than the gap
+        candidates = [
+            row for row in tenants
+            if row["shard"] == heaviest and 0 < row["activity_logs"] < gap
+        ]
+        if not candidates:
+            break
+        tenant = max(candidates, key=lambda row: row["activity_logs"])
+
+        moves.append({"company_id": tenant["company_id"], "from": heaviest, "to": lightest, "activity_logs": tenant["activity_logs"]})
+        load[heaviest] -= tenant["activity_logs"]
+        load[lightest] += tenant["activity_logs"]
+        tenant["shard"] = lightest
+    return moves
+
+def main():
+    from app.core.logging import setup_logging
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="Tenant shard maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("report", help="Show tenants and their size per shard")
+    move = commands.add_parser("move", help="Move one tenant to another shard")
+    move.add_argument("company_id", type=int)
+    move.add_argument("shard")
+    rebalance = commands.add_parser("rebalance", help="Plan (and optionally run) moves of hot tenants")
+    rebalance.add_argument("--apply", action="store_true")
+    rebalance.add_argument("--max-moves", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "report":
+        for row in tenant_report():
+            print(f"{row['shard']:<12} {row['company_id']:>6} {row['users']:>8} users {row['activity_logs']:>10} logs  {row['name']}")
+    elif args.command == "move":
+        move_tenant(args.company_id, args.shard)
+    elif args.command == "rebalance":
+        moves = plan_rebalance(tenant_report(), max_moves=args.max_moves)
+        for planned in moves:
+            print(f"company {planned['company_id']}: {planned['from']} -> {planned['to']} ({planned['activity_logs']} logs)")
+            if args.apply:
+                move_tenant(planned["company_id"], planned["to"])
+        if not moves:
+            print("Shards are balanced")
+
+if __name__ == "__main__":
+    main()
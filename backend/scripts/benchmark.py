@@ -0,0 +1,51 @@
+"""Closed-loop HTTP load generator used for the numbers in deployment_guide.md.
+
+Usage: python scripts/benchmark.py http://localhost:8000/health --concurrency 64 --duration 20
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+async def worker(client: httpx.AsyncClient, url: str, headers: dict, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.get(url, headers=headers)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+async def run(url: str, concurrency: int, duration: float, token: str | None):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies, errors = [], []
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(
+            worker(client, url, headers, deadline, latencies, errors) for _ in range(concurrency)
+        ))
+
+    latencies.sort()
+    def pct(p):
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 if latencies else 0.0
+
+    print(f"{url}: {len(latencies) / duration:.0f} req/s, "
+          f"p50 {pct(0.50):.1f} ms, p99 {pct(0.99):.1f} ms, errors {len(errors)}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("url")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--token", help="Bearer token for authenticated endpoints")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.concurrency, args.duration, args.token))
+
+if __name__ == "__main__":
+    main()
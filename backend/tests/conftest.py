@@ -0,0 +1,82 @@
+import itertools
+import json
+import os
+import tempfile
+
+# Settings are read at import time, so the test databases are configured
+# before anything from app is imported: a main database plus two shards
+_db_dir = tempfile.mkdtemp(prefix="saas_platform_tests_")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_db_dir}/main.db",
+    "SHARD_DATABASE_URLS": json.dumps({
+        "a": f"sqlite:///{_db_dir}/shard_a.db",
+        "b": f"sqlite:///{_db_dir}/shard_b.db",
+    }),
+    "TENANT_MOVE_GRACE_SECONDS": "0",
+    "TENANT_MOVE_BATCH_SIZE": "20",
+    "TENANT_DIRECTORY_CACHE_SECONDS": "0.05",
+    "TENANT_DELETE_THROTTLE_SECONDS": "0",
+    "PROFILE_SYNC_SECONDS": "0.2",
+    "PROFILE_IDLE_SYNC_SECONDS": "0.5",
+})
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.database import SessionLocal
+from app.core.sharding import tenant_session
+from app.main import app
+from app.models.directory import TenantDirectory
+from app.models.user import User
+
+_names = itertools.count(1)
+
+@pytest.fixture(scope="session")
+def client():
+    # Entering the client runs the startup hooks (deletion watchdog, profiler sync, heartbeat)
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def login(client, email: str, password: str = "secret") -> dict:
+    response = client.post("/auth/login", json={"email": email, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture
+def tenant(client):
+    """A freshly signed-up company; returns (company_id, admin email, admin headers)."""
+    n = next(_names)
+    email = f"admin{n}@example.com"
+    response = client.post("/auth/signup", json={"company_name": f"Company {n}", "email": email, "password": "secret"})
+    assert response.status_code == 200, response.text
+
+    db = SessionLocal()
+    try:
+        company_id = db.query(TenantDirectory.company_id).filter(TenantDirectory.name == f"Company {n}").scalar()
+    finally:
+        db.close()
+    return company_id, email, login(client, email)
+
+def set_role(company_id: int, email: str, role: str):
+    tenant_db = tenant_session(company_id)
+    try:
+        tenant_db.query(User).filter(User.email == email).update({"role": role})
+        tenant_db.commit()
+    finally:
+        tenant_db.close()
+
+def set_directory_status(company_id: int, status: str):
+    db = SessionLocal()
+    try:
+        db.query(TenantDirectory).filter(TenantDirectory.company_id == company_id).update({"status": status})
+        db.commit()
+    finally:
+        db.close()
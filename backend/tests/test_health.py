@@ -0,0 +1,18 @@
+import os
+import time
+
+def test_health_lists_this_worker(client):
+    # The heartbeat is written by a background thread started with the app
+    deadline = time.monotonic() + 5
+    while True:
+        response = client.get("/health")
+        assert response.status_code == 200
+        health = response.json()
+        workers = [worker for worker in health["workers"] if worker["pid"] == os.getpid()]
+        if workers or time.monotonic() > deadline:
+            break
+        time.sleep(0.1)
+
+    assert health["status"] == "ok"
+    assert health["pid"] == os.getpid()
+    assert len(workers) == 1 and workers[0]["alive"]
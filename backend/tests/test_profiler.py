@@ -0,0 +1,39 @@
+from tests.conftest import login, set_role
+
+def test_profile_logins(client, tenant):
+    company_id, email, headers = tenant
+    set_role(company_id, email, "PLATFORM_ADMIN")
+    headers = login(client, email)
+
+    response = client.post("/admin/profiling/start", json={
+        "route": "/auth/login", "sample_rate": 1, "interval_ms": 1, "max_overhead": 0.2
+    }, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["active"]
+    try:
+        for _ in range(5):
+            login(client, email)
+
+        status = client.get("/admin/profiling/status", headers=headers).json()
+        assert status["requests_profiled"] == 5
+        assert status["samples"] > 0
+        assert status["workers"] == 1
+        assert "bcrypt" in status["categories"]
+
+        flamegraph = client.get("/admin/profiling/flamegraph", headers=headers).text
+        assert flamegraph.startswith("route:POST /auth/login;")
+        # Only the selected route is profiled, not the profiling endpoints
+        assert all(line.startswith("route:POST /auth/login;") for line in flamegraph.splitlines())
+
+        speedscope = client.get("/admin/profiling/speedscope", headers=headers).json()
+        assert speedscope["profiles"]
+    finally:
+        response = client.post("/admin/profiling/stop", headers=headers)
+    assert response.status_code == 200, response.text
+    assert not response.json()["active"]
+    assert response.json()["stop_reason"] == "stopped"
+
+def test_profiling_needs_platform_admin(client, tenant):
+    _, _, headers = tenant
+    response = client.post("/admin/profiling/start", json={"route": "/auth/login"}, headers=headers)
+    assert response.status_code == 403
@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import app.services.tenant_move as tenant_move
+from app.core.sharding import placement_shards, shard_sessions, tenant_session
+from app.models.activity import ActivityLog
+from app.models.directory import TenantDirectory, UserDirectory
+from app.models.user import User
+from app.services.tenant_move import move_tenant, tenant_report
+from tests.conftest import login, set_directory_status
+
+def shard_of(db, company_id: int) -> str:
+    db.expire_all()
+    return db.query(TenantDirectory.shard).filter(TenantDirectory.company_id == company_id).scalar()
+
+def other_shard(shard: str) -> str:
+    return next(name for name in placement_shards if name != shard)
+
+def count_rows(shard: str, model, company_id: int) -> int:
+    shard_db = shard_sessions[shard]()
+    try:
+        return shard_db.query(model).filter(model.company_id == company_id).count()
+    finally:
+        shard_db.close()
+
+def test_new_tenants_go_to_configured_shards(db, tenant):
+    company_id, _, _ = tenant
+    assert shard_of(db, company_id) in placement_shards
+
+def test_signup_login_and_move_round_trip(client, db, tenant):
+    company_id, email, headers = tenant
+    response = client.post("/users/", json={"email": f"staff{company_id}@example.com", "password": "secret"}, headers=headers)
+    assert response.status_code == 200, response.text
+
+    source = shard_of(db, company_id)
+    target = other_shard(source)
+    logs_before = count_rows(source, ActivityLog, company_id)
+    move_tenant(company_id, target)
+
+    assert shard_of(db, company_id) == target
+    assert count_rows(source, User, company_id) == 0
+    assert count_rows(target, User, company_id) == 2
+    assert count_rows(target, ActivityLog, company_id) == logs_before
+
+    # Tokens issued before the move keep working, and so does logging in
+    assert len(client.get("/users/", headers=headers).json()) == 2
+    login(client, f"staff{company_id}@example.com")
+    row = next(row for row in tenant_report() if row["company_id"] == company_id)
+    assert row["shard"] == target and row["users"] == 2
+
+def test_move_picks_up_writes_made_while_copying(client, db, tenant, monkeypatch):
+    company_id, email, headers = tenant
+    source = shard_of(db, company_id)
+    real_copy_round = tenant_move._copy_round
+    calls = []
+
+    def copy_round_then_write(*args):
+        result = real_copy_round(*args)
+        if not calls:
+            # The tenant keeps working during the live rounds
+            response = client.post("/users/", json={"email": f"late{company_id}@example.com", "password": "secret"}, headers=headers)
+            assert response.status_code == 200, response.text
+        calls.append(args)
+        return result
+
+    monkeypatch.setattr(tenant_move, "_copy_round", copy_round_then_write)
+    move_tenant(company_id, other_shard(source))
+
+    target = shard_of(db, company_id)
+    assert target != source
+    assert count_rows(target, User, company_id) == 2
+    shard_db = shard_sessions[target]()
+    try:
+        actions = [action for action, in shard_db.query(ActivityLog.action).filter(ActivityLog.company_id == company_id)]
+    finally:
+        shard_db.close()
+    assert "EMPLOYEE_CREATED" in actions
+
+def test_writes_refused_while_moving(client, tenant):
+    company_id, email, headers = tenant
+    set_directory_status(company_id, "moving")
+    try:
+        response = client.post("/users/", json={"email": f"blocked{company_id}@example.com", "password": "secret"}, headers=headers)
+        assert response.status_code == 503
+        # Reads go on, and logins only lose their audit log entry
+        assert client.get("/users/", headers=headers).status_code == 200
+        login(client, email)
+    finally:
+        set_directory_status(company_id, "active")
+
+    response = client.post("/users/", json={"email": f"blocked{company_id}@example.com", "password": "secret"}, headers=headers)
+    assert response.status_code == 200, response.text
+
+def test_move_refused_while_deleting(db, tenant):
+    company_id, _, _ = tenant
+    target = other_shard(shard_of(db, company_id))
+    set_directory_status(company_id, "deleting")
+    try:
+        with pytest.raises(ValueError):
+            move_tenant(company_id, target)
+    finally:
+        set_directory_status(company_id, "active")
+
+def test_signup_cannot_join_company_being_deleted(client, db, tenant):
+    company_id, _, _ = tenant
+    name = db.query(TenantDirectory.name).filter(TenantDirectory.company_id == company_id).scalar()
+    set_directory_status(company_id, "deleting")
+    try:
+        response = client.post("/auth/signup", json={"company_name": name, "email": f"joiner{company_id}@example.com", "password": "secret"})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Company is being deleted"
+    finally:
+        set_directory_status(company_id, "active")
+
+def test_orphaned_email_is_reclaimed(client, db, tenant):
+    company_id, _, _ = tenant
+    # As left by a crash between the directory and shard commits
+    email = f"orphan{company_id}@example.com"
+    db.add(UserDirectory(email=email, company_id=company_id))
+    db.commit()
+
+    response = client.post("/auth/signup", json={"company_name": f"Orphan {company_id}", "email": email, "password": "secret"})
+    assert response.status_code == 400
+
+    db.query(UserDirectory).filter(UserDirectory.email == email).update(
+        {"created_at": datetime.now(timezone.utc) - timedelta(hours=1)}
+    )
+    db.commit()
+    response = client.post("/auth/signup", json={"company_name": f"Orphan {company_id}", "email": email, "password": "secret"})
+    assert response.status_code == 200, response.text
+    login(client, email)
+
+def test_failed_signup_releases_company_name(client, db, monkeypatch):
+    import app.routers.auth as auth
+
+    def broken_tenant_session(company_id):
+        session = tenant_session(company_id)
+        session.commit = lambda: (_ for _ in ()).throw(RuntimeError("shard down"))
+        return session
+
+    monkeypatch.setattr(auth, "tenant_session", broken_tenant_session)
+    with pytest.raises(RuntimeError):
+        client.post("/auth/signup", json={"company_name": "Doomed", "email": "doomed@example.com", "password": "secret"})
+
+    assert db.query(TenantDirectory).filter(TenantDirectory.name == "Doomed").first() is None
+    assert db.query(UserDirectory).filter(UserDirectory.email == "doomed@example.com").first() is None
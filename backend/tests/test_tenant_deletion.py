@@ -0,0 +1,84 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+from app.models.directory import TenantDirectory, UserDirectory
+from app.models.tenant_deletion import TenantDeletionJob
+from app.services.tenant_deletion import _claim_job, resume_tenant_deletions
+from tests.conftest import set_directory_status
+
+def wait_for_job(db, job_id: int, timeout: float = 10) -> TenantDeletionJob:
+    deadline = time.monotonic() + timeout
+    while True:
+        db.expire_all()
+        job = db.query(TenantDeletionJob).filter(TenantDeletionJob.id == job_id).one()
+        if job.status in ("completed", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+def add_job(db, company_id: int, status: str = "pending", heartbeat_at=None) -> int:
+    job = TenantDeletionJob(company_id=company_id, requested_by=0, status=status, heartbeat_at=heartbeat_at)
+    db.add(job)
+    db.commit()
+    return job.id
+
+def test_delete_company(client, db, tenant):
+    company_id, email, headers = tenant
+    response = client.post("/users/", json={"email": f"staff{company_id}@example.com", "password": "secret"}, headers=headers)
+    assert response.status_code == 200, response.text
+
+    response = client.delete("/companies/me", headers=headers)
+    assert response.status_code == 202, response.text
+    job_id = response.json()["id"]
+
+    job = wait_for_job(db, job_id)
+    assert job.status == "completed", job.error
+    assert job.users_deleted == 2
+    assert client.get(f"/companies/deletion-jobs/{job_id}", headers=headers).json()["status"] == "completed"
+
+    assert db.query(TenantDirectory).filter(TenantDirectory.company_id == company_id).first() is None
+    assert db.query(UserDirectory).filter(UserDirectory.company_id == company_id).count() == 0
+    response = client.post("/auth/login", json={"email": email, "password": "secret"})
+    assert response.status_code == 400
+
+def test_claim_job_once(db):
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(seconds=settings.TENANT_DELETE_STALE_SECONDS + 1)
+    pending = add_job(db, 900001)
+    running = add_job(db, 900002, status="running", heartbeat_at=now)
+    abandoned = add_job(db, 900003, status="running", heartbeat_at=stale)
+    failed = add_job(db, 900004, status="failed")
+
+    assert _claim_job(db, pending, retry_failed=False)
+    assert not _claim_job(db, pending, retry_failed=False)
+    assert not _claim_job(db, running, retry_failed=False)
+    assert _claim_job(db, abandoned, retry_failed=False)
+    assert not _claim_job(db, failed, retry_failed=False)
+    assert _claim_job(db, failed, retry_failed=True)
+
+def test_resume_takes_over_abandoned_job(client, db, tenant):
+    company_id, email, headers = tenant
+    # As left behind by a worker that died halfway through a deletion
+    set_directory_status(company_id, "deleting")
+    stale = datetime.now(timezone.utc) - timedelta(seconds=settings.TENANT_DELETE_STALE_SECONDS + 1)
+    job_id = add_job(db, company_id, status="running", heartbeat_at=stale)
+
+    resume_tenant_deletions()
+    job = wait_for_job(db, job_id)
+    assert job.status == "completed", job.error
+    assert job.users_deleted == 1
+    assert db.query(TenantDirectory).filter(TenantDirectory.company_id == company_id).first() is None
+
+def test_delete_refused_while_moving(client, db, tenant):
+    company_id, _, headers = tenant
+    # SQLite hands the ids of deleted tenants out again, so jobs are counted overall
+    jobs_before = db.query(TenantDeletionJob).count()
+    set_directory_status(company_id, "moving")
+    try:
+        response = client.delete("/companies/me", headers=headers)
+        assert response.status_code == 503
+    finally:
+        set_directory_status(company_id, "active")
+
+    assert db.query(TenantDeletionJob).count() == jobs_before
+    assert client.get("/companies/me", headers=headers).json()["status"] == "active"